@@ -1,66 +1,357 @@
-import subprocess
 import os
-import requests
+import sys
+import atexit
 import base64
+import functools
+import threading
 import time
 import json
-from dotenv import load_dotenv
+import re
+import stat
+import tempfile
+import logging
+from dotenv import find_dotenv, load_dotenv
+
+# optional: orjson (or ujson) encodes payloads and parses response bytes several times
+# faster than the stdlib; requests accepts either str or bytes bodies
+try:
+	import orjson
+	_loads, _dumps = orjson.loads, orjson.dumps
+except ImportError:
+	try:
+		import ujson
+		_loads, _dumps = ujson.loads, ujson.dumps
+	except ImportError:
+		_loads, _dumps = json.loads, json.dumps
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
 
 base_url = "https://api.lumen.com"
 
+# Endpoint URLs are built once at import; only the inventory serviceId varies between calls
+_TOKEN_URL = f"{base_url}/oauth/v2/token"
+_INVENTORY_URL = f"{base_url}/ProductInventory/v1/inventory?pageNumber=1&pageSize=10&naasEnabled=true&entitled=true&serviceType=Internet&serviceId="
+_PRICE_REQUEST_URL = f"{base_url}/Product/v1/priceRequest"
+_ORDER_REQUEST_URL = f"{base_url}/Customer/v3/Ordering/orderRequest"
+
+# Static parts of the request payloads; serializing only reads them, so they can be shared
+_PRICE_REQUEST_STATIC = {
+	"sourceSystem": "NaaS ExternalApi",
+	"customerPriceRequestDescription": "NaaS Price Request",
+	"customerPurchaseOrderNumber": "",
+}
+_JSON_CONTENT = {'Content-Type': 'application/json'}
+_ORDER_STATIC = {
+	"channel": [{"id": 99, "name": "NaaS ExternalApi"}],
+	"note": [{"text": "Change"}],
+}
+_ORDER_ITEM_STATIC = {"quantity": 1, "action": "modify"}
+_ORDER_PRODUCT_STATIC = {
+	"productCharacteristic": [],
+	"productSpecification": {"id": "5001", "name": "NaaS Internet"},
+}
+_ORDER_PRODUCT_OFFERING = {"id": "718", "name": "Internet On-Demand"}
+# relatedContactInformation field -> env var
+_ORDER_CONTACT_ENV = (
+	("number", "CONTACT_PHONE"),
+	("emailAddress", "CONTACT_EMAIL"),
+	("role", "CONTACT_ROLE"),
+	("organization", "CONTACT_ORG"),
+	("name", "CONTACT_NAME"),
+)
+
+# Shared session so calls to the Lumen API reuse the same keep-alive connection, see _session()
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+# (connect, read) seconds, so a hung connection cannot block a caller indefinitely
+_HTTP_TIMEOUT = (3.05, 30)
+
+# resolved once so reads, mtime checks and rewrites all target the same file as load_dotenv
+_ENV_PATH = find_dotenv() or '.env'
+# st_mtime_ns of .env when it was last parsed; None until the first load
+_ENV_MTIME = None
+# "KEY=" at the start of a .env line; like python-dotenv, allows surrounding whitespace and
+# an "export " prefix. Blank lines and comments do not match.
+_ENV_KEY_RE = re.compile(r'^\s*(?:export\s+)?([A-Za-z_][A-Za-z0-9_.]*)\s*=')
+# lines of .env as last read or written by _update_env_file, with a key -> line index
+_ENV_LINES = None
+_ENV_INDEX = {}
+_ENV_LINES_MTIME = None
+# .env updates applied to os.environ but not yet written, see _stage_env()
+_PENDING_ENV = {}
+# guards _PENDING_ENV, which the background token refresh also stages into
+_PENDING_LOCK = threading.Lock()
+
+# (customer_number, service_id) -> (fetched at, ETag, parsed inventory), see check_inventory()
+_INVENTORY_CACHE = {}
+_INVENTORY_TTL = 30
+
+_EGRESS_IP_URLS = (
+	"https://ifconfig.me/ip",
+	"https://api.ipify.org",
+	"https://checkip.amazonaws.com",
+)
+_EGRESS_IP_TTL = 60
+_EGRESS_IP = None
+_EGRESS_IP_FETCHED_AT = 0.0
+
+
+def _session():
+	"""Return the shared requests.Session, creating it on first use.
+
+	requests pulls in urllib3, idna, certifi and friends, so it is imported here rather than at
+	module load; runs that never reach the network (e.g. cron runs where the bandwidths
+	already match) skip that startup cost.
+	"""
+	global _SESSION
+	if _SESSION is not None:
+		return _SESSION
+	with _SESSION_LOCK:
+		if _SESSION is None:
+			import requests
+			from requests.adapters import HTTPAdapter
+			from urllib3.util.retry import Retry
+
+			session = requests.Session()
+			session.headers.update({'Accept': 'application/json'})
+			# Transient failures are retried on the pooled connection instead of failing the
+			# workflow. raise_on_status=False hands the final response back so callers still
+			# report the error.
+			session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=Retry(
+				total=3,
+				backoff_factor=0.25,
+				status_forcelist=[429, 500, 502, 503, 504],
+				allowed_methods=["GET", "POST"],
+				respect_retry_after_header=True,
+				raise_on_status=False,
+			)))
+			# Placing an order is not idempotent, so a retried POST could place it twice
+			session.mount(_ORDER_REQUEST_URL, HTTPAdapter(max_retries=0))
+			# A price request creates a quote too; only retry when the API reports it did not
+			# process the request (429/503), never after a read error
+			session.mount(_PRICE_REQUEST_URL, HTTPAdapter(max_retries=Retry(
+				total=3,
+				read=False,
+				backoff_factor=0.25,
+				status_forcelist=[429, 503],
+				allowed_methods=["POST"],
+				respect_retry_after_header=True,
+				raise_on_status=False,
+			)))
+			atexit.register(session.close)
+			_SESSION = session
+	return _SESSION
+
+
+def _env_mtime() -> int:
+	"""Return the st_mtime_ns of .env, or 0 when the file does not exist."""
+	try:
+		return os.stat(_ENV_PATH).st_mtime_ns
+	except FileNotFoundError:
+		return 0
+
+
+def _ensure_env(force: bool = False) -> None:
+	"""Load .env into os.environ, re-parsing it only when the file has changed on disk.
+
+	Values staged with `_stage_env` are already in os.environ, so our own writes do not
+	trigger a re-parse. Pass `force=True` to re-read it regardless.
+	"""
+	global _ENV_MTIME
+	mtime = _env_mtime()
+	if mtime == _ENV_MTIME and not force:
+		return
+	reload = _ENV_MTIME is not None
+	load_dotenv(_ENV_PATH, override=force or reload)
+	_ENV_MTIME = mtime
+	if reload:
+		# the token may have been refreshed by another process
+		_TOK.loaded = False
+	# keep staged values that have not been flushed yet
+	with _PENDING_LOCK:
+		os.environ.update(_PENDING_ENV)
+
+
+# Parse .env once up front; later _ensure_env() calls only stat the file
+_ensure_env()
+
+
 def get_egress_ip():
 	"""
 	Retrieve the current egress IP address and persist it to .env as EGRESS_IP.
 	
-	Returns the IP address string, or None on failure.
+	The lookup is cached for `_EGRESS_IP_TTL` seconds since the address rarely changes
+	between sequential API calls. Returns the IP address string, or None on failure.
 	"""
-	try:
-		result = subprocess.run(['curl', '-s', 'ifconfig.me'], capture_output=True, text=True)
-		egress_ip = result.stdout.strip()
-		if not egress_ip:
-			raise ValueError("No IP returned from ifconfig.me")
-		
-		print(f"{egress_ip}")
-		_update_env_file({'EGRESS_IP': egress_ip})
-		os.environ['EGRESS_IP'] = egress_ip
-		return egress_ip
-	except Exception as e:
-		print(f"Failed to get egress IP: {e}")
+	global _EGRESS_IP, _EGRESS_IP_FETCHED_AT
+	if _EGRESS_IP and time.monotonic() - _EGRESS_IP_FETCHED_AT < _EGRESS_IP_TTL:
+		return _EGRESS_IP
+	session = _session()
+	import requests  # loaded by _session(); needed for its exception types
+
+	# try each lookup service in turn so one outage does not fail the whole step
+	errors = []
+	for url in _EGRESS_IP_URLS:
+		try:
+			response = session.get(url, timeout=_HTTP_TIMEOUT)
+			response.raise_for_status()
+		except requests.RequestException as e:
+			errors.append(f"{url}: {e}")
+			continue
+		# an IP address is plain ASCII; decoding the bytes directly skips requests' charset detection
+		egress_ip = response.content.decode('ascii', errors='replace').strip()
+		if egress_ip:
+			break
+		errors.append(f"{url}: no IP returned")
+	else:
+		logger.error("Failed to get egress IP: %s", "; ".join(errors))
 		return None
 
+	logger.debug("egress IP: %s", egress_ip)
+	_stage_env({'EGRESS_IP': egress_ip})
+	_EGRESS_IP = egress_ip
+	_EGRESS_IP_FETCHED_AT = time.monotonic()
+	return egress_ip
+
+def _read_env_lines():
+	"""Return (lines, key -> line index) for .env, reusing the last parse while it is unchanged."""
+	global _ENV_LINES, _ENV_INDEX, _ENV_LINES_MTIME
+	mtime = _env_mtime()
+	if _ENV_LINES is not None and mtime == _ENV_LINES_MTIME:
+		return _ENV_LINES, _ENV_INDEX
+
+	lines = []
+	if mtime:
+		with open(_ENV_PATH, 'r', encoding='utf-8') as f:
+			lines = f.readlines()
+	index = {}
+	for i, line in enumerate(lines):
+		m = _ENV_KEY_RE.match(line)
+		if m:
+			index[m.group(1)] = i
+	_ENV_LINES, _ENV_INDEX, _ENV_LINES_MTIME = lines, index, mtime
+	return lines, index
+
+
 def _update_env_file(updates: dict) -> None:
 	"""Update or append keys in the local .env file.
 
 	This is intentionally simple: it preserves the existing file layout and comments,
-	replacing any lines that start with a key that's present in `updates`, and appending
-	any keys not already present.
+	replacing the line that defines each key present in `updates` (the last one, if a key is
+	repeated), and appending any keys not already present.
 	"""
-	env_path = '.env'
-	lines = []
-	if os.path.exists(env_path):
-		with open(env_path, 'r') as f:
-			lines = f.readlines()
-
-	out_lines = []
-	replaced = set()
-	for line in lines:
-		stripped = line.strip()
-		if not stripped or stripped.startswith('#') or '=' not in line:
-			out_lines.append(line)
-			continue
-		key = line.split('=', 1)[0]
-		if key in updates:
-			out_lines.append(f"{key}={updates[key]}\n")
-			replaced.add(key)
+	global _ENV_MTIME, _ENV_LINES, _ENV_INDEX, _ENV_LINES_MTIME
+	env_path = _ENV_PATH
+	# only our own write will have changed the file if it matches what was last parsed
+	in_sync = _ENV_MTIME is not None and _env_mtime() == _ENV_MTIME
+	# edit a copy; the cached parse must keep matching the file if the write below fails
+	lines, index = _read_env_lines()
+	lines, index = list(lines), dict(index)
+
+	changed = False
+	for k, v in updates.items():
+		new_line = f"{k}={v}\n"
+		i = index.get(k)
+		if i is None:
+			if lines and not lines[-1].endswith('\n'):
+				lines[-1] += '\n'
+			index[k] = len(lines)
+			lines.append(new_line)
+		elif lines[i].rstrip('\n') != new_line[:-1]:
+			lines[i] = new_line
 		else:
-			out_lines.append(line)
+			# already holds the requested value
+			continue
+		changed = True
+	if not changed:
+		return
+
+	# write the whole file in one go and swap it into place so readers never see a partial file
+	data = "".join(lines).encode('utf-8')
+	# replace the symlink target rather than the link itself, and keep the file's permissions
+	real_path = os.path.realpath(env_path)
+	try:
+		mode = stat.S_IMODE(os.stat(real_path).st_mode)
+	except FileNotFoundError:
+		mode = 0o600
+	fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(real_path), prefix='.env.', suffix='.tmp')
+	try:
+		# a buffered file object retries short writes that a bare os.write() would leave partial
+		with os.fdopen(fd, 'wb') as f:
+			f.write(data)
+		os.chmod(tmp_path, mode)
+		os.replace(tmp_path, real_path)
+	except BaseException:
+		try:
+			os.unlink(tmp_path)
+		except OSError:
+			pass
+		raise
+	_ENV_LINES, _ENV_INDEX, _ENV_LINES_MTIME = lines, index, _env_mtime()
+	if in_sync:
+		_ENV_MTIME = _ENV_LINES_MTIME
+
+
+def _stage_env(updates: dict) -> None:
+	"""Apply `updates` to os.environ now and queue them for the next `flush_env()`.
+
+	Staging lets a workflow collect every .env change and rewrite the file once. Values that
+	os.environ already holds are dropped, so steady-state runs leave .env untouched.
+	"""
+	env = os.environ
+	with _PENDING_LOCK:
+		updates = {k: str(v) for k, v in updates.items() if env.get(k) != str(v)}
+		if not updates:
+			return
+		env.update(updates)
+		_PENDING_ENV.update(updates)
+
+
+def flush_env() -> None:
+	"""Write all staged updates to .env in a single rewrite."""
+	with _PENDING_LOCK:
+		if not _PENDING_ENV:
+			return
+		_update_env_file(_PENDING_ENV)
+		# cleared only once written, so a failed write can be retried by the next flush
+		_PENDING_ENV.clear()
 
-	for k, v in updates.items():
-		if k not in replaced:
-			out_lines.append(f"{k}={v}\n")
 
-	with open(env_path, 'w') as f:
-		f.writelines(out_lines)
+atexit.register(flush_env)
+
+
+class _TokenCache:
+	"""In-process copy of the access token and its expiry (epoch secs, 0 when unknown)."""
+
+	def __init__(self):
+		self.token = None
+		self.bearer = ''
+		self.expires_at = 0
+		self.loaded = False
+
+	def set(self, token, expires_at: int) -> None:
+		"""Store a token along with its prebuilt `Bearer ...` header value."""
+		self.token = token
+		self.bearer = f'Bearer {token}' if token else ''
+		self.expires_at = expires_at
+		self.loaded = True
+
+
+_TOK = _TokenCache()
+_REFRESH_LOCK = threading.Lock()
+# last background refresh started by get_valid_access_token(), see _join_background_refresh()
+_REFRESH_THREAD = None
+
+
+def _load_token_cache() -> None:
+	"""Populate `_TOK` from ACCESS_TOKEN / ACCESS_TOKEN_EXPIRES_AT on first use."""
+	if _TOK.loaded:
+		return
+	_ensure_env()
+	expires_at = os.getenv('ACCESS_TOKEN_EXPIRES_AT', '')
+	# anything unparseable is treated as expired
+	_TOK.set(os.getenv('ACCESS_TOKEN'), int(expires_at) if expires_at.isdigit() else 0)
 
 
 def get_access_token(force: bool = False) -> str:
@@ -73,36 +364,48 @@ def get_access_token(force: bool = False) -> str:
 	
 	Raises ValueError on failure to obtain a token.
 	"""
-	load_dotenv()
 	if not force:
-		token = os.getenv('ACCESS_TOKEN')
-		if token and not is_access_token_expired():
-			return token
+		_load_token_cache()
+		if _TOK.token and not is_access_token_expired():
+			return _TOK.token
+
+	with _REFRESH_LOCK:
+		# another thread may have refreshed while we waited for the lock
+		if not force and _TOK.token and not is_access_token_expired():
+			return _TOK.token
+		return _fetch_access_token()
+
 
+@functools.lru_cache(maxsize=4)
+def _basic_auth(username: str, secret: str) -> str:
+	"""Return the complete `Basic ...` Authorization header value for the OAuth endpoint."""
+	return "Basic " + base64.b64encode(f"{username}:{secret}".encode()).decode()
+
+
+def _fetch_access_token() -> str:
+	"""Request a new token from the OAuth endpoint and store it. Callers hold `_REFRESH_LOCK`."""
 	username = os.getenv('USERNAME')
 	secret = os.getenv('SECRET')
 	if not username or not secret:
 		raise ValueError("USERNAME and SECRET must be set in .env file.")
 
-	url = f"{base_url}/oauth/v2/token"
-	payload = 'grant_type=client_credentials'
-	basic_auth = base64.b64encode(f"{username}:{secret}".encode()).decode()
-	headers = {
-		'Content-Type': 'application/x-www-form-urlencoded',
-		'Authorization': f"Basic {basic_auth}"
-	}
+	url = _TOKEN_URL
+	# requests form-encodes the dict and sets Content-Type itself
+	payload = {'grant_type': 'client_credentials'}
+	headers = {'Authorization': _basic_auth(username, secret)}
 
-	response = requests.post(url, headers=headers, data=payload)
+	response = _session().post(url, headers=headers, data=payload, timeout=_HTTP_TIMEOUT)
 	if response.status_code != 200:
 		raise ValueError(f"Failed to get token: {response.status_code} {response.text}")
 
-	data = response.json()
+	data = _loads(response.content)
 	access_token = data.get('access_token')
 	expires_in = data.get('expires_in')
 	if not access_token:
 		raise ValueError("No access token found in response.")
 
 	updates = {'ACCESS_TOKEN': access_token}
+	expires_at = 0
 	if expires_in is not None:
 		try:
 			expires_at = int(time.time()) + int(expires_in)
@@ -111,53 +414,102 @@ def get_access_token(force: bool = False) -> str:
 			# ignore expiry if parsing fails
 			pass
 
-	# write and update in-memory env for immediate use
-	_update_env_file(updates)
-	os.environ['ACCESS_TOKEN'] = access_token
-	if 'ACCESS_TOKEN_EXPIRES_AT' in updates:
-		os.environ['ACCESS_TOKEN_EXPIRES_AT'] = updates['ACCESS_TOKEN_EXPIRES_AT']
+	_TOK.set(access_token, expires_at)
 
-	print(f"ACCESS_TOKEN updated (expires_in={expires_in})")
+	# update in-memory env for immediate use; LUMEN_PERSIST_TOKEN=0 keeps the token out of
+	# .env for single-shot runs where no other process reads it from there
+	if os.getenv('LUMEN_PERSIST_TOKEN', '1') != '0':
+		_stage_env(updates)
+	else:
+		os.environ.update(updates)
+
+	logger.debug("ACCESS_TOKEN updated (expires_in=%s)", expires_in)
 	return access_token
 
 
 def is_access_token_expired(buffer_seconds: int = 30) -> bool:
 	"""Return True if the stored access token is missing or will expire within buffer_seconds."""
-	load_dotenv()
-	expires_at = os.getenv('ACCESS_TOKEN_EXPIRES_AT')
-	if not expires_at:
-		return True
+	_load_token_cache()
+	return _TOK.expires_at <= int(time.time()) + int(buffer_seconds)
+
+
+def _background_refresh(buffer_seconds: int) -> None:
+	"""Refresh the token off the caller's thread. Runs with `_REFRESH_LOCK` already held."""
 	try:
-		expires_at_i = int(expires_at)
-		return expires_at_i <= int(time.time()) + int(buffer_seconds)
-	except Exception:
-		# if parsing fails, treat as expired
-		return True
-
-
-def get_valid_access_token(buffer_seconds: int = 30) -> str:
-	"""Return a valid access token, refreshing it if missing/expired."""
-	load_dotenv()
-	token = os.getenv('ACCESS_TOKEN')
-	if token and not is_access_token_expired(buffer_seconds):
-		return token
-	# refresh
-	new = get_access_token()
+		if is_access_token_expired(buffer_seconds):
+			_fetch_access_token()
+	except Exception as e:
+		logger.debug("Background token refresh failed: %s", e)
+	finally:
+		_REFRESH_LOCK.release()
+
+
+def _join_background_refresh(timeout: float = 5.0) -> None:
+	"""Wait up to `timeout` seconds for a running background refresh so its token gets flushed."""
+	thread = _REFRESH_THREAD
+	if thread is not None and thread.is_alive():
+		thread.join(timeout)
+
+
+# registered after flush_env so it runs first at exit
+atexit.register(_join_background_refresh)
+
+
+def get_valid_access_token(buffer_seconds: int = 30, stale_seconds: int = 180) -> str:
+	"""Return a valid access token, refreshing it if missing/expired.
+
+	The cached token is FRESH, STALE (expires within `stale_seconds`) or EXPIRED (missing or
+	expires within `buffer_seconds`). A STALE token is still returned, but a refresh is started
+	in the background so callers do not wait on the token endpoint; only EXPIRED blocks.
+	"""
+	global _REFRESH_THREAD
+	_load_token_cache()
+	if _TOK.token and not is_access_token_expired(buffer_seconds):
+		# skip when a refresh is already running; the lock is released by the worker
+		if is_access_token_expired(stale_seconds) and _REFRESH_LOCK.acquire(blocking=False):
+			_REFRESH_THREAD = threading.Thread(target=_background_refresh, args=(stale_seconds,), daemon=True)
+			_REFRESH_THREAD.start()
+		return _TOK.token
+	# refresh; only one thread hits the token endpoint, the others reuse its result
+	with _REFRESH_LOCK:
+		if _TOK.token and not is_access_token_expired(buffer_seconds):
+			return _TOK.token
+		new = _fetch_access_token()
 	if not new:
 		raise ValueError("Failed to obtain access token")
 	return new
 
 
+def _require(purpose: str, values: dict) -> None:
+	"""Raise ValueError naming every variable in `values` that is unset or empty."""
+	missing = [name for name, value in values.items() if not value]
+	if missing:
+		raise ValueError(f"Missing required environment variables for {purpose}: {', '.join(missing)}")
+
+
+def _api_headers(customer_number: str, extra: dict = None) -> dict:
+	"""Return the headers for a Lumen API call using the cached Bearer token."""
+	headers = {'x-customer-number': customer_number, 'Authorization': _TOK.bearer}
+	if extra:
+		headers.update(extra)
+	return headers
+
+
 def check_inventory():
 	"""
 	Query Lumen inventory API using service_id and customer_number from .env.
 	Use ACCESS_TOKEN from env. Save billing account id/name and bandwidth to .env.
 	Return the parsed JSON response.
+
+	Responses are reused for `_INVENTORY_TTL` seconds per (customer, service); after that the
+	request is revalidated with the stored ETag so an unchanged inventory comes back as a 304.
 	"""
-	load_dotenv()
-	service_id = os.getenv('SERVICE_ID')
-	customer_number = os.getenv('CUSTOMER_NUMBER')
-	access_token = os.getenv('ACCESS_TOKEN')
+	_ensure_env()
+	_load_token_cache()
+	env = os.environ
+	service_id = env.get('SERVICE_ID')
+	customer_number = env.get('CUSTOMER_NUMBER')
+	access_token = _TOK.token
 	if not service_id:
 		raise ValueError('SERVICE_ID must be set in .env')
 	if not customer_number:
@@ -165,24 +517,33 @@ def check_inventory():
 	if not access_token:
 		raise ValueError('ACCESS_TOKEN must be set in .env')
 
-	url = f"{base_url}/ProductInventory/v1/inventory?pageNumber=1&pageSize=10&naasEnabled=true&entitled=true&serviceType=Internet&serviceId={service_id}"
-	headers = {
-		'x-customer-number': customer_number,
-		'Authorization': f'Bearer {access_token}'
-	}
+	cache_key = (customer_number, service_id)
+	cached = _INVENTORY_CACHE.get(cache_key)
+	if cached and time.monotonic() - cached[0] < _INVENTORY_TTL:
+		return cached[2]
 
-	response = requests.get(url, headers=headers)
-	try:
+	url = _INVENTORY_URL + service_id
+	headers = _api_headers(customer_number)
+	if cached and cached[1]:
+		headers['If-None-Match'] = cached[1]
+
+	response = _session().get(url, headers=headers, timeout=_HTTP_TIMEOUT)
+	if not response.ok:
+		logger.error("Inventory request failed: %s %s", response.status_code, response.text)
 		response.raise_for_status()
-	except requests.HTTPError:
-		print(f"Inventory request failed: {response.status_code} {response.text}")
-		raise
 
-	try:
-		data = response.json()
-	except ValueError:
-		print(response.text)
-		return response.text
+	if response.status_code == 304 and cached:
+		# unchanged since the cached copy; its env values were already staged
+		_INVENTORY_CACHE[cache_key] = (time.monotonic(), cached[1], cached[2])
+		return cached[2]
+
+	# read the body once and decide from the Content-Type how to decode it
+	body = response.content
+	if 'json' not in response.headers.get('Content-Type', ''):
+		text = body.decode(response.encoding or 'utf-8', errors='replace')
+		logger.debug("inventory response: %s", text)
+		return text
+	data = _loads(body)
 
 	# Save billing account and bandwidth to env
 	service_inventory = data.get('serviceInventory', []) if isinstance(data, dict) else []
@@ -195,15 +556,15 @@ def check_inventory():
 		if billing.get('name'):
 			env_updates['BILLING_ACCOUNT_NAME'] = billing['name']
 		location = svc.get('location', {})
-		if location.get('masterSiteid'):	
+		if location.get('masterSiteid'):
 			env_updates['MASTER_SITE_ID'] = location['masterSiteid']
-		bandwidth = next((pc.get('value') for pc in svc.get('productCharacteristic', []) or [] if pc.get('name') == 'Bandwidth'), None)
+		characteristics = {pc['name']: pc['value'] for pc in svc.get('productCharacteristic') or [] if 'name' in pc and 'value' in pc}
+		bandwidth = characteristics.get('Bandwidth')
 		if bandwidth:
 			env_updates['SERVICE_BANDWIDTH'] = str(bandwidth).lower()
 		if env_updates:
-			_update_env_file(env_updates)
-			for k, v in env_updates.items():
-				os.environ[k] = v
+			_stage_env(env_updates)
+	_INVENTORY_CACHE[cache_key] = (time.monotonic(), response.headers.get('ETag'), data)
 	return data
 
 
@@ -217,7 +578,7 @@ def set_quote_bandwidth():
 	
 	Returns the bandwidth value set.
 	"""
-	load_dotenv()
+	_ensure_env()
 
 	# Ensure we have an egress IP; if not, attempt to retrieve it
 	egress_ip = os.getenv('EGRESS_IP')
@@ -246,11 +607,10 @@ def set_quote_bandwidth():
 		raise ValueError(f"{source} must be set in .env file.")
 
 	# Persist the chosen quote bandwidth
-	_update_env_file({'QUOTE_BANDWIDTH': bandwidth})
-	os.environ['QUOTE_BANDWIDTH'] = bandwidth
+	_stage_env({'QUOTE_BANDWIDTH': bandwidth})
 
-	print(f"Egress IP: {egress_ip_n}, LUMEN_IP: {lumen_ip_n}")
-	print(f"Match: {egress_ip_n == lumen_ip_n}, QUOTE_BANDWIDTH set to: {bandwidth}")
+	logger.debug("Egress IP: %s, LUMEN_IP: %s", egress_ip_n, lumen_ip_n)
+	logger.debug("Match: %s, QUOTE_BANDWIDTH set to: %s", egress_ip_n == lumen_ip_n, bandwidth)
 
 	return bandwidth
 
@@ -260,25 +620,33 @@ def price_request():
 	"""
 	Send a price request to the Lumen API using env values and print only the id from the response.
 	"""
-	load_dotenv()
-
-	url = f"{base_url}/Product/v1/priceRequest"
-	customer_number = os.getenv('CUSTOMER_NUMBER')
-	currency_code = os.getenv('CURRENCY_CODE')
-	master_site_id = os.getenv('MASTER_SITE_ID')
-	partner_id = os.getenv('PARTNER_ID')
-	quote_bandwidth = os.getenv('QUOTE_BANDWIDTH')
-	product_code = os.getenv('PRODUCT_CODE')
-	product_name = os.getenv('PRODUCT_NAME')
-	access_token = os.getenv('ACCESS_TOKEN')
-
-	if not all([customer_number, currency_code, master_site_id, partner_id, quote_bandwidth, product_code, product_name, access_token]):
-		raise ValueError("Missing required environment variables for price request.")
-
-	payload = json.dumps({
-		"sourceSystem": "NaaS ExternalApi",
-		"customerPriceRequestDescription": "NaaS Price Request",
-		"customerPurchaseOrderNumber": "",
+	_ensure_env()
+
+	url = _PRICE_REQUEST_URL
+	env = os.environ
+	customer_number = env.get('CUSTOMER_NUMBER')
+	currency_code = env.get('CURRENCY_CODE')
+	master_site_id = env.get('MASTER_SITE_ID')
+	partner_id = env.get('PARTNER_ID')
+	quote_bandwidth = env.get('QUOTE_BANDWIDTH')
+	product_code = env.get('PRODUCT_CODE')
+	product_name = env.get('PRODUCT_NAME')
+	_load_token_cache()
+	access_token = _TOK.token
+
+	_require('price request', {
+		'CUSTOMER_NUMBER': customer_number,
+		'CURRENCY_CODE': currency_code,
+		'MASTER_SITE_ID': master_site_id,
+		'PARTNER_ID': partner_id,
+		'QUOTE_BANDWIDTH': quote_bandwidth,
+		'PRODUCT_CODE': product_code,
+		'PRODUCT_NAME': product_name,
+		'ACCESS_TOKEN': access_token,
+	})
+
+	payload = _dumps({
+		**_PRICE_REQUEST_STATIC,
 		"customerNumber": customer_number,
 		"currencyCode": currency_code,
 		"masterSiteId": master_site_id,
@@ -287,99 +655,74 @@ def price_request():
 		"productName": product_name,
 		"speed": quote_bandwidth
 	})
-	headers = {
-		'x-customer-number': customer_number,
-		'Content-Type': 'application/json',
-		'Authorization': f'Bearer {access_token}'
-	}
+	headers = _api_headers(customer_number, _JSON_CONTENT)
 
-	response = requests.post(url, headers=headers, data=payload)
-	try:
+	response = _session().post(url, headers=headers, data=payload, timeout=_HTTP_TIMEOUT)
+	if not response.ok:
+		logger.error("Price request failed: %s %s", response.status_code, response.text)
 		response.raise_for_status()
-	except requests.HTTPError:
-		print(f"Price request failed: {response.status_code} {response.text}")
-		raise
 
 	try:
-		data = response.json()
+		data = _loads(response.content)
 	except ValueError:
-		print(response.text)
+		logger.info("%s", response.text)
 		return
 
 	quote_id = data.get('id')
 	if quote_id:
-		_update_env_file({'QUOTE_ID': quote_id})
-		os.environ['QUOTE_ID'] = quote_id
-	print(quote_id)
+		_stage_env({'QUOTE_ID': quote_id})
+	logger.info("%s", quote_id)
 
 def order_request():
 	"""
 	Place an order request using env variables and static values as described.
 	"""
 
-	url = f"{base_url}/Customer/v3/Ordering/orderRequest"
-	access_token = os.getenv('ACCESS_TOKEN')
-	customer_number = os.getenv('CUSTOMER_NUMBER')
-	billing_account_id = os.getenv('BILLING_ACCOUNT_ID')
-	billing_account_name = os.getenv('BILLING_ACCOUNT_NAME')
-	external_id_prefix = os.getenv('EXTERNAL_ID_PREFIX')
-	quote_id = os.getenv('QUOTE_ID')
-	service_id = os.getenv('SERVICE_ID')
-	product_code = '718'
-	product_name = 'Internet On-Demand'
-	contact_name = os.getenv('CONTACT_NAME')
-	contact_role = os.getenv('CONTACT_ROLE')
-	contact_email = os.getenv('CONTACT_EMAIL')
-	contact_org = os.getenv('CONTACT_ORG')
-	contact_phone = os.getenv('CONTACT_PHONE')
-
-	if not all([access_token, customer_number, billing_account_id, billing_account_name, quote_id, service_id, product_code, product_name]):
-		raise ValueError("Missing required environment variables for order request.")
-
-	# Generate externalId: prefix + unique string, max 20 chars
-	suffix = str(int(time.time()))
-	max_len = 20
-	allowed_suffix_len = max_len - len(external_id_prefix)
-	if allowed_suffix_len <= 0:
-		external_id = external_id_prefix[:max_len]
+	url = _ORDER_REQUEST_URL
+	env = os.environ
+	_load_token_cache()
+	access_token = _TOK.token
+	customer_number = env.get('CUSTOMER_NUMBER')
+	billing_account_id = env.get('BILLING_ACCOUNT_ID')
+	billing_account_name = env.get('BILLING_ACCOUNT_NAME')
+	external_id_prefix = env.get('EXTERNAL_ID_PREFIX')
+	quote_id = env.get('QUOTE_ID')
+	service_id = env.get('SERVICE_ID')
+	contact = {field: env.get(key) for field, key in _ORDER_CONTACT_ENV}
+
+	_require('order request', {
+		'ACCESS_TOKEN': access_token,
+		'CUSTOMER_NUMBER': customer_number,
+		'BILLING_ACCOUNT_ID': billing_account_id,
+		'BILLING_ACCOUNT_NAME': billing_account_name,
+		'EXTERNAL_ID_PREFIX': external_id_prefix,
+		'QUOTE_ID': quote_id,
+		'SERVICE_ID': service_id,
+	})
+
+	# Generate externalId: prefix + the trailing (fastest changing) timestamp digits, max 20 chars
+	allowed_suffix_len = 20 - len(external_id_prefix)
+	if allowed_suffix_len > 0:
+		external_id = external_id_prefix + str(int(time.time()))[-allowed_suffix_len:]
 	else:
-		external_id = external_id_prefix + suffix[-allowed_suffix_len:]
-	external_id = external_id[:20]
+		external_id = external_id_prefix[:20]
 
-	payload = json.dumps({
+	order = {
 		"externalId": external_id,
 		"billingAccount": {
 			"id": billing_account_id,
 			"name": billing_account_name
 		},
-		"channel": [
-			{
-				"id": 99,
-				"name": "NaaS ExternalApi"
-			}
-		],
-		"note": [
-			{
-				"text": "Change"
-			}
-		],
+		**_ORDER_STATIC,
 		"productOrderItem": [
 			{
 				"id": service_id,
-				"quantity": 1,
-				"action": "modify",
+				**_ORDER_ITEM_STATIC,
 				"product": {
 					"id": service_id,
-					"productCharacteristic": [],
-					"productSpecification": {
-						"id": "5001",
-						"name": "NaaS Internet"
-					}
+					**_ORDER_PRODUCT_STATIC
 				},
-				"productOffering": {
-					"id": product_code,
-					"name": product_name
-				}
+				"productOffering": _ORDER_PRODUCT_OFFERING
 			}
 		],
 		"quote": [
@@ -387,39 +730,29 @@ def order_request():
 				"id": quote_id,
 				"name": quote_id
 			}
-		],
-		"relatedContactInformation": [
-			{
-				"number": contact_phone,
-				"emailAddress": contact_email,
-				"role": contact_role,
-				"organization": contact_org,
-				"name": contact_name,
-				"numberExtension": ""
-			}
 		]
-	})
-	headers = {
-		'x-customer-number': customer_number,
-		'Content-Type': 'application/json',
-		'Authorization': f'Bearer {access_token}'
 	}
-
-	response = requests.post(url, headers=headers, data=payload)
-	try:
+	if any(contact.values()):
+		order["relatedContactInformation"] = [{**contact, "numberExtension": ""}]
+	payload = _dumps(order)
+	headers = _api_headers(customer_number, _JSON_CONTENT)
+
+	response = _session().post(url, headers=headers, data=payload, timeout=_HTTP_TIMEOUT)
+	if not response.ok:
+		logger.error("Order request failed: %s %s", response.status_code, response.text)
 		response.raise_for_status()
-	except requests.HTTPError:
-		print(f"Order request failed: {response.status_code} {response.text}")
-		raise
 
-	print(response.text)
+	# the order changes the service, so the next inventory check must not reuse the cached copy
+	_INVENTORY_CACHE.pop((customer_number, service_id), None)
+	logger.info("%s", response.text)
 
 def main():
 	"""
-	Main workflow: check inventory, compare SERVICE_BANDWIDTH with QUOTE_BANDWIDTH.
+	Main workflow: set QUOTE_BANDWIDTH, check inventory, compare SERVICE_BANDWIDTH with QUOTE_BANDWIDTH.
 	
-	If SERVICE_BANDWIDTH != QUOTE_BANDWIDTH, request a price quote and end.
-	If they are the same, no quote is requested.
+	If SERVICE_BANDWIDTH != QUOTE_BANDWIDTH, request a price quote and place the order.
+	If they are the same, no quote is requested. When the SERVICE_BANDWIDTH saved by a previous
+	run already matches, the run ends before making any API call.
 	
 	Requires .env file with:
 	- USERNAME, SECRET (OAuth credentials)
@@ -430,47 +763,96 @@ def main():
 	- QUOTE_BANDWIDTH (set via set_quote_bandwidth())
 	"""
 	try:
-		# Ensure access token is available before all steps
-		get_valid_access_token()
-		# Step 1: Check inventory
-		print("Step 1: Checking inventory...")
-		check_inventory()
-		print(f"Inventory check complete.\n")
+		# staged .env changes are written even when a step fails; a failed write is
+		# reported like any other error
+		try:
+			# Step 1: Set quote bandwidth based on egress IP (no Lumen API call needed)
+			logger.info("Step 1: Setting quote bandwidth...")
+			quote_bandwidth = set_quote_bandwidth()
+			logger.info("")
+
+			# Nothing to do if the last known service bandwidth already matches
+			service_bandwidth = os.getenv('SERVICE_BANDWIDTH')
+			if service_bandwidth and service_bandwidth == quote_bandwidth:
+				logger.info("SERVICE_BANDWIDTH already matches QUOTE_BANDWIDTH (%s). No quote needed.\n", quote_bandwidth)
+				return 0
+
+			# Ensure access token is available before the API steps
+			get_valid_access_token()
+			# Step 2: Check inventory
+			logger.info("Step 2: Checking inventory...")
+			check_inventory()
+			logger.info("Inventory check complete.\n")
+
+			# Step 3: Compare SERVICE_BANDWIDTH with QUOTE_BANDWIDTH
+			service_bandwidth = os.getenv('SERVICE_BANDWIDTH')
+
+			logger.info("Step 3: Comparing bandwidth values: SERVICE_BANDWIDTH: %s, QUOTE_BANDWIDTH: %s", service_bandwidth, quote_bandwidth)
+
+			if service_bandwidth == quote_bandwidth:
+				logger.info("Bandwidths match. No quote needed.\n")
+				return 0
+
+			logger.info("Bandwidths differ. Requesting price quote...\n")
+
+			# Step 4: Request price quote (only if bandwidths differ)
+			logger.info("Step 4: Requesting price quote...")
+			price_request()
+			logger.info("Price quote requested successfully. \n")
+
+			# Step 5: Place order based on quote
+			logger.info("Step 5: Placing order based on quote...")
+			order_request()
+			# the saved bandwidth is now out of date; clear it so the next run re-checks inventory
+			# instead of taking the early exit on a pre-order value
+			_stage_env({'SERVICE_BANDWIDTH': ''})
+			logger.info("Order placed successfully based on quote %s.\n", os.getenv('QUOTE_ID'))
+		finally:
+			_join_background_refresh()
+			flush_env()
+	except Exception as e:
+		logger.error("Error: %s", e)
+		return 1
 
-		# Step 2: Set quote bandwidth based on egress IP
-		print("Step 2: Setting quote bandwidth...")
-		set_quote_bandwidth()
-		print()
+	return 0
 
-		# Step 3: Compare SERVICE_BANDWIDTH with QUOTE_BANDWIDTH
-		load_dotenv()
-		quote_bandwidth = os.getenv('QUOTE_BANDWIDTH')
-		service_bandwidth = os.getenv('SERVICE_BANDWIDTH')
+class _BufferedStreamHandler(logging.StreamHandler):
+	"""StreamHandler that leaves flushing to its stream's buffer.
 
-		print(f"Step 3: Comparing bandwidth values: SERVICE_BANDWIDTH: {service_bandwidth}, QUOTE_BANDWIDTH: {quote_bandwidth}")
+	logging.StreamHandler flushes after every record, which would turn a buffered stream back
+	into one write() per message. The stream is flushed when the handler is closed instead.
+	"""
 
-		if service_bandwidth == quote_bandwidth:
-			print("Bandwidths match. No quote needed.\n")
-			return 0
+	def flush(self) -> None:
+		pass
 
-		print("Bandwidths differ. Requesting price quote...\n")
+	def close(self) -> None:
+		try:
+			# logging.shutdown() closes handlers at exit, after any late (e.g. DEBUG) records
+			self.stream.flush()
+		finally:
+			super().close()
 
-		# Step 4: Request price quote (only if bandwidths differ)
-		print("Step 4: Requesting price quote...")
-		price_request()
-		print(f"Price quote requested successfully. \n")
 
-		# Step 5: Place order based on quote
-		print("Step 5: Placing order based on quote...")
-		order_request()
-		print(f"Order placed successfully based on quote {os.getenv('QUOTE_ID')}.\n")
+def _configure_logging() -> None:
+	"""Send log output to stdout through a 64 KB buffer, flushed at exit.
 
-	except Exception as e:
-		print(f"Error: {e}")
-		return 1
+	A run then costs a couple of write() calls instead of one per message. On a terminal the
+	stream stays line-buffered so progress is still visible as it happens. LOGLEVEL (default
+	INFO) sets the verbosity, e.g. WARNING for silent scripted runs or DEBUG for diagnostics.
+	"""
+	buffering = 1 if sys.stdout.isatty() else 65536
+	stream = open(sys.stdout.fileno(), 'w', buffering=buffering, closefd=False)
+	atexit.register(stream.flush)
+	handler = _BufferedStreamHandler(stream)
+	handler.setFormatter(logging.Formatter('%(message)s'))
+	logger.addHandler(handler)
+	try:
+		logger.setLevel(os.getenv('LOGLEVEL', 'INFO').upper())
+	except ValueError:
+		logger.setLevel(logging.INFO)
 
-	return 0
 
 if __name__ == '__main__':
-	
+	_configure_logging()
 	exit(main())
\ No newline at end of file